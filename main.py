@@ -1,8 +1,10 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
 import json
+import difflib
 from datetime import datetime
 import os
 
@@ -14,6 +16,10 @@ st.set_page_config(
 )
 
 # --- Google Sheets Configuration ---
+AUDIT_LOG_COLUMNS = ["Timestamp", "User Name", "User Email", "Agency", "Activity", "Changes"]
+AUDIT_LOG_DISPLAY_LIMIT = 200
+
+@st.cache_resource
 def get_gspread_client():
     """
     Initializes and returns a gspread client object.
@@ -39,23 +45,137 @@ def get_gspread_client():
         st.info("Please ensure your Google Service Account credentials are correctly configured in Streamlit secrets.")
         st.stop()
 
-def get_data_from_gsheet(client, sheet_name="JWP_Data", worksheet_name="Sheet1"):
+def coerce_dtypes(df):
+    """Sheets returns every cell as a string; restore the types the editor expects."""
+    if 'Budget Spent' in df.columns:
+        df['Budget Spent'] = pd.to_numeric(df['Budget Spent'], errors='coerce')
+    for col in ['End Date', 'Last Updated']:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors='coerce', format='ISO8601')
+    return df
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_data_from_gsheet(sheet_name="JWP_Data", worksheet_name="Sheet1"):
     """
     Fetches data from a Google Sheet and returns it as a Pandas DataFrame.
+    Results are cached per (sheet_name, worksheet_name) for a short time so that
+    reruns do not hit the Sheets API; call get_data_from_gsheet.clear() to force a reload.
+    Errors are raised rather than caught so a failed read is never cached.
     """
-    try:
-        sheet = client.open(sheet_name).worksheet(worksheet_name)
-        data = sheet.get_all_records()
-        return pd.DataFrame(data)
-    except gspread.exceptions.SpreadsheetNotFound:
-        st.error(f"Spreadsheet '{sheet_name}' not found. Please create it or check the name.")
-        return pd.DataFrame()
-    except gspread.exceptions.WorksheetNotFound:
-        st.error(f"Worksheet '{worksheet_name}' not found in '{sheet_name}'.")
+    client = get_gspread_client()
+    sheet = client.open(sheet_name).worksheet(worksheet_name)
+    values = sheet.get_all_values()
+    if not values:
         return pd.DataFrame()
+    return coerce_dtypes(pd.DataFrame(values[1:], columns=values[0]))
+
+def build_agency_index(df):
+    """
+    Maps each agency to the sheet rows holding its activities, as contiguous
+    runs like "2:5,9:9" (the header is sheet row 1), plus the number of rows and
+    the letter of the sheet's Agency column.
+    """
+    agency_col = gspread.utils.rowcol_to_a1(1, df.columns.get_loc('Agency') + 1).rstrip("1")
+    index_rows = []
+    for agency, positions in df.groupby('Agency').indices.items():
+        runs = []
+        start = prev = positions[0] + 2
+        for row in positions[1:] + 2:
+            if row != prev + 1:
+                runs.append(f"{start}:{prev}")
+                start = row
+            prev = row
+        runs.append(f"{start}:{prev}")
+        index_rows.append([str(agency), ",".join(runs), len(positions), agency_col])
+    return index_rows
+
+def parse_agency_index(index_rows):
+    """Turns Agency_Index rows into {agency: (row ranges, row count, Agency column letter)}."""
+    return {
+        row[0]: (row[1].split(","), int(row[2]), row[3])
+        for row in index_rows if len(row) > 3 and row[1]
+    }
+
+def update_agency_index(client, df, sheet_name="JWP_Data"):
+    """Rewrites the Agency_Index worksheet so stakeholders can fetch only their own rows."""
+    try:
+        sh = client.open(sheet_name)
+        try:
+            index_sheet = sh.worksheet("Agency_Index")
+        except gspread.exceptions.WorksheetNotFound:
+            index_sheet = sh.add_worksheet(title="Agency_Index", rows="100", cols="4")
+        index_sheet.clear()
+        index_sheet.update([["Agency", "Rows", "Count", "Agency Column"]] + build_agency_index(df))
+        get_agency_index.clear()
+        get_agency_data.clear()
     except Exception as e:
-        st.error(f"An error occurred while fetching data: {e}")
-        return pd.DataFrame()
+        st.warning(f"Could not update the agency index: {e}")
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_agency_index(sheet_name="JWP_Data"):
+    """
+    Returns the parsed Agency_Index worksheet, or {} if it doesn't exist.
+    Other errors are raised rather than caught so a failed read is never cached.
+    """
+    try:
+        index_sheet = get_gspread_client().open(sheet_name).worksheet("Agency_Index")
+    except gspread.exceptions.WorksheetNotFound:
+        return {}
+    return parse_agency_index(index_sheet.get_all_values()[1:])
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_agency_data(agency, sheet_name="JWP_Data", worksheet_name="Sheet1"):
+    """
+    Fetches only the header and the given agency's rows in a single batch_get.
+    The index labels are sheet positions (sheet row - 2), matching a full fetch.
+    The live Agency column is read in the same call; if the agency's rows no longer
+    match the index (rows added, removed or moved since it was built), or the index
+    is missing, the agency's rows are taken from the full sheet instead.
+    Fallbacks are silent: UI calls made inside a cached function are replayed for the whole TTL.
+    """
+    try:
+        entry = get_agency_index(sheet_name).get(agency)
+    except Exception:
+        entry = None
+    if not entry:
+        return agency_rows(get_data_from_gsheet(sheet_name, worksheet_name), agency)
+    ranges, count, agency_col = entry
+    try:
+        sheet = get_gspread_client().open(sheet_name).worksheet(worksheet_name)
+        value_ranges = sheet.batch_get(["1:1", f"{agency_col}2:{agency_col}"] + ranges)
+        header = value_ranges[0][0]
+        live_labels = [label for label, cell in enumerate(value_ranges[1]) if cell and cell[0] == agency]
+        rows, labels = [], []
+        for row_range, values in zip(ranges, value_ranges[2:]):
+            start = int(row_range.split(":")[0])
+            for offset, row in enumerate(values):
+                rows.append(row + [""] * (len(header) - len(row)))
+                labels.append(start + offset - 2)
+        df = coerce_dtypes(pd.DataFrame(rows, columns=header, index=labels))
+    except Exception:
+        return agency_rows(get_data_from_gsheet(sheet_name, worksheet_name), agency)
+    # Rows were added, removed or moved since the index was built
+    if len(df) != count or labels != live_labels:
+        return agency_rows(get_data_from_gsheet(sheet_name, worksheet_name), agency)
+    return df
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_agency_list(sheet_name="JWP_Data", worksheet_name="Sheet1"):
+    """Sorted list of agencies, computed once per fetch of the master data."""
+    df = get_data_from_gsheet(sheet_name, worksheet_name)
+    return sorted(df['Agency'].dropna().unique().tolist()) if 'Agency' in df.columns else []
+
+def agency_rows(df, agency):
+    """Returns the given agency's rows, keeping their sheet-position index labels."""
+    return df[df['Agency'] == agency] if 'Agency' in df.columns else df.iloc[0:0]
+
+def clear_data_caches():
+    """Drops all cached sheet data and anything derived from it."""
+    get_data_from_gsheet.clear()
+    get_agency_index.clear()
+    get_agency_data.clear()
+    get_agency_list.clear()
+    convert_df_to_csv.clear()
 
 def update_gsheet_from_dataframe(client, df, sheet_name="JWP_Data", worksheet_name="Sheet1"):
     """
@@ -65,29 +185,177 @@ def update_gsheet_from_dataframe(client, df, sheet_name="JWP_Data", worksheet_na
         sheet = client.open(sheet_name).worksheet(worksheet_name)
         sheet.clear()
         # Convert DataFrame to a list of lists to upload
-        sheet.update([df.columns.values.tolist()] + df.values.tolist())
+        rows = [[to_cell_value(val) for val in row] for row in df.values.tolist()]
+        sheet.update([df.columns.values.tolist()] + rows)
+        # Drop cached reads so everyone sees the new data on the next rerun
+        clear_data_caches()
         return True
     except Exception as e:
         st.error(f"Failed to update Google Sheet: {e}")
         return False
         
-def log_edit(client, user_name, user_email, agency, activity, changes):
-    """Logs an edit to the audit log in Google Sheets."""
+def batch_update_cells(client, updates, sheet_name="JWP_Data", worksheet_name="Sheet1"):
+    """
+    Writes only the given cells to a Google Sheet in a single API call.
+    `updates` is a list of {"range": "B3", "values": [[value]]} dicts.
+    """
+    try:
+        sheet = client.open(sheet_name).worksheet(worksheet_name)
+        sheet.batch_update(updates, value_input_option="RAW")
+        clear_data_caches()
+        return True
+    except Exception as e:
+        st.error(f"Failed to update Google Sheet: {e}")
+        return False
+
+def to_cell_value(val):
+    """Converts a DataFrame value into something the Sheets API can serialize."""
+    if val is None or (not isinstance(val, str) and pd.isna(val)):
+        return ""
+    if isinstance(val, (pd.Timestamp, datetime)):
+        # Keep the time of day for timestamps such as 'Last Updated'
+        if (val.hour, val.minute, val.second) != (0, 0, 0):
+            return val.strftime("%Y-%m-%d %H:%M:%S")
+        return val.strftime("%Y-%m-%d")
+    if hasattr(val, "isoformat"):
+        return val.isoformat()
+    if hasattr(val, "item"):
+        return val.item()
+    return val
+
+def fetch_sheet_rows(client, sheet_rows, sheet_name="JWP_Data", worksheet_name="Sheet1"):
+    """
+    Returns the header and the current values of the given sheet rows in one API call.
+    Bypasses the cache on purpose: this is what save-time conflict checks compare against.
+    """
+    sheet = client.open(sheet_name).worksheet(worksheet_name)
+    value_ranges = sheet.batch_get(["1:1"] + [f"{row}:{row}" for row in sheet_rows])
+    rows = [values[0] if values else [] for values in value_ranges]
+    return rows[0], rows[1:]
+
+def find_conflicts(agency_df, row_versions, header, indices, current_rows):
+    """
+    Returns (index, current values, same_row) for every edited row that no longer matches what
+    the user loaded: either another activity now sits at that sheet row (rows were overwritten,
+    inserted or reordered) or the row's version moved on.
+    """
+    conflicts = []
+    for index, current in zip(indices, current_rows):
+        current_values = dict(zip(header, current))
+        same_row = (
+            current_values.get('Agency') == str(agency_df.at[index, 'Agency'])
+            and current_values.get('Activity') == str(agency_df.at[index, 'Activity'])
+        )
+        try:
+            version = int(current_values.get('Row Version') or 1)
+        except ValueError:
+            version = 1
+        if not same_row or version != row_versions.get(index, 1):
+            conflicts.append((index, current_values, same_row))
+    return conflicts
+
+def show_conflicts(agency_df, conflicts):
+    """Reports rows that changed on the sheet since they were loaded, with a diff of what changed."""
+    columns = agency_df.columns.tolist()
+    for index, current_values, same_row in conflicts:
+        sheet_row = index + 2
+        if same_row:
+            st.error(
+                f"Row {sheet_row} ('{agency_df.at[index, 'Activity']}') was updated by someone else "
+                f"(last updated {current_values.get('Last Updated') or 'unknown'}) since you loaded it — please reload."
+            )
+        else:
+            st.error(
+                f"Row {sheet_row} no longer holds '{agency_df.at[index, 'Activity']}' — the sheet was "
+                "overwritten or reorganised since you loaded it. Please reload."
+            )
+        loaded = [f"{col}: {to_cell_value(agency_df.at[index, col])}" for col in columns]
+        latest = [f"{col}: {current_values.get(col, '')}" for col in columns]
+        diff = difflib.unified_diff(loaded, latest, fromfile="your copy", tofile="current sheet", lineterm="")
+        st.code("\n".join(diff), language="diff")
+
+def locate_columns(header, columns):
+    """
+    Maps column names to 1-based sheet columns using the sheet's current header.
+    Columns the sheet doesn't have yet (e.g. 'Row Version' on older sheets) are placed after
+    the last one, and the header cells to write for them are returned alongside.
+    """
+    positions, header_updates = {}, []
+    width = len(header)
+    for col in columns:
+        if col in header:
+            positions[col] = header.index(col) + 1
+        else:
+            width += 1
+            positions[col] = width
+            header_updates.append({"range": gspread.utils.rowcol_to_a1(1, width), "values": [[col]]})
+    return positions, header_updates
+
+def comparable(series, dtype):
+    """
+    Casts a column to `dtype` and fills nulls with a sentinel of that type, so
+    edits can be compared with a plain `!=` and empty cells compare equal.
+    """
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return pd.to_datetime(series, errors='coerce').fillna(pd.Timestamp.min)
+    if pd.api.types.is_numeric_dtype(dtype):
+        return pd.to_numeric(series, errors='coerce').fillna(-np.inf)
+    return series.fillna("")
+
+def build_log_entries(user_name, user_email, agency, changes_list):
+    """
+    Builds audit log rows for a save without touching the network.
+    `changes_list` is a list of (activity, changes) tuples.
+    """
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return [
+        [timestamp, user_name, user_email, agency, activity, json.dumps(changes)]
+        for activity, changes in changes_list
+    ]
+
+def flush_audit_log(client, entries):
+    """Appends all audit log rows to Google Sheets in a single API call."""
+    if not entries:
+        return
     try:
-        log_sheet = client.open("JWP_Data").worksheet("Audit_Log")
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_entry = [timestamp, user_name, user_email, agency, activity, json.dumps(changes)]
-        log_sheet.append_row(log_entry)
-    except gspread.exceptions.WorksheetNotFound:
-        # Create the sheet if it doesn't exist
         sh = client.open("JWP_Data")
-        log_sheet = sh.add_worksheet(title="Audit_Log", rows="1000", cols="6")
-        log_sheet.append_row(["Timestamp", "User Name", "User Email", "Agency", "Activity", "Changes"])
-        log_entry = [timestamp, user_name, user_email, agency, activity, json.dumps(changes)]
-        log_sheet.append_row(log_entry)
+        try:
+            log_sheet = sh.worksheet("Audit_Log")
+        except gspread.exceptions.WorksheetNotFound:
+            # Create the sheet if it doesn't exist
+            log_sheet = sh.add_worksheet(title="Audit_Log", rows="1000", cols="6")
+            entries = [AUDIT_LOG_COLUMNS] + entries
+        log_sheet.append_rows(entries, value_input_option="RAW")
+        load_audit_log.clear()
     except Exception as e:
         st.warning(f"Could not write to audit log: {e}")
 
+@st.cache_data(ttl=30, show_spinner=False)
+def load_audit_log(limit=AUDIT_LOG_DISPLAY_LIMIT):
+    """
+    Returns the most recent audit log entries, newest first.
+    The log is append-only, so the tail of the sheet is already the latest entries and no sort is needed.
+    """
+    try:
+        log_sheet = get_gspread_client().open("JWP_Data").worksheet("Audit_Log")
+        rows = log_sheet.get("A2:F", value_render_option="UNFORMATTED_VALUE")
+    except gspread.exceptions.WorksheetNotFound:
+        return pd.DataFrame(columns=AUDIT_LOG_COLUMNS)
+    recent = [row + [""] * (len(AUDIT_LOG_COLUMNS) - len(row)) for row in rows[-limit:][::-1]]
+    return pd.DataFrame(recent, columns=AUDIT_LOG_COLUMNS)
+
+def hash_master_df(df):
+    """
+    Cache key for a DataFrame: a vectorized hash of every cell and index label,
+    much cheaper than Streamlit's default pickle-based hash.
+    """
+    return (str(df.columns.tolist()), int(pd.util.hash_pandas_object(df, index=True).sum()))
+
+@st.cache_data(ttl=60, max_entries=10, hash_funcs={pd.DataFrame: hash_master_df})
+def convert_df_to_csv(df):
+    """Encodes a DataFrame as CSV bytes for download."""
+    return df.to_csv(index=False).encode('utf-8')
+
 # --- Main Application Logic ---
 def main():
     st.title("Joint Work Plan (JWP) Progress Tracker")
@@ -103,34 +371,55 @@ def main():
 
     # Initialize client and data
     client = get_gspread_client()
-    master_df = get_data_from_gsheet(client)
+    if st.sidebar.button("Refresh"):
+        clear_data_caches()
+    try:
+        if st.session_state['logged_in'] and not st.session_state['is_admin']:
+            # Stakeholders only need their own agency's rows
+            master_df = get_agency_data(st.session_state['user_agency'])
+        else:
+            master_df = get_data_from_gsheet()
+    except gspread.exceptions.SpreadsheetNotFound:
+        st.error("Spreadsheet 'JWP_Data' not found. Please create it or check the name.")
+        st.stop()
+    except gspread.exceptions.WorksheetNotFound:
+        st.error("Worksheet 'Sheet1' not found in 'JWP_Data'.")
+        st.stop()
+    except Exception as e:
+        st.error(f"An error occurred while fetching data: {e}")
+        st.stop()
 
     if master_df.empty:
-        st.warning("The master dataset is empty. The admin may need to upload the initial CSV.")
+        # Stakeholders only load their own rows, so an empty frame just means no activities for their agency
+        if not st.session_state['logged_in'] or st.session_state['is_admin']:
+            st.warning("The master dataset is empty. The admin may need to upload the initial CSV.")
         # Create a placeholder dataframe if empty
         master_df = pd.DataFrame(columns=[
             'Outcome', 'Sub-Output', 'Agency', 'Activity', 
-            'End Date', 'Budget Spent', 'Progress / Achievement to Date', 'Last Updated'
+            'End Date', 'Budget Spent', 'Progress / Achievement to Date', 'Last Updated', 'Row Version'
         ])
 
+    # Every row carries a version number used to detect concurrent edits
+    if 'Row Version' not in master_df.columns:
+        master_df['Row Version'] = 1
+    master_df['Row Version'] = pd.to_numeric(master_df['Row Version'], errors='coerce').fillna(1).astype(int)
+
     # --- Login / Main View Logic ---
     if not st.session_state['logged_in']:
-        login_view(master_df)
+        login_view(get_agency_list())
     else:
         if st.session_state['is_admin']:
             admin_view(client, master_df)
         else:
             stakeholder_view(client, master_df)
 
-def login_view(df):
+def login_view(agencies):
     """Displays the login form for stakeholders and admins."""
     st.header("Login")
     
     col1, col2 = st.columns([1, 2])
     
     with col1:
-        agencies = sorted(df['Agency'].unique().tolist()) if 'Agency' in df.columns else []
-        
         user_name = st.text_input("Your Name", key="login_name")
         user_email = st.text_input("Your Email", key="login_email")
         user_agency = st.selectbox("Select Your Agency", agencies, key="login_agency", index=0 if agencies else None)
@@ -179,20 +468,30 @@ def stakeholder_view(client, master_df):
     st.sidebar.header(f"Welcome, {st.session_state['user_name']}")
     st.sidebar.write(f"**Agency:** {st.session_state['user_agency']}")
     if st.sidebar.button("Logout"):
-        for key in st.session_state.keys():
-            del st.session_state[key]
+        st.session_state.clear()
         st.rerun()
-    
+
+    stakeholder_editor(master_df, client)
+
+@st.fragment
+def stakeholder_editor(master_df, client):
+    """
+    Renders the agency data editor and save button.
+    Runs as a fragment so editing only reruns this section, not the whole page.
+    """
     st.header(f"Activities for {st.session_state['user_agency']}")
     st.info("You can edit the 'End Date', 'Budget Spent', and 'Progress' columns for your agency's activities. The first four columns are locked. Click 'Save Updates' below the table to persist your changes.")
     
-    # Filter data for the user's agency
-    agency_df = master_df[master_df['Agency'] == st.session_state['user_agency']].copy()
+    # Data is already limited to the user's agency when it is loaded
+    agency_df = master_df.copy()
     
     if agency_df.empty:
         st.warning("No activities found for your agency.")
         return
 
+    # Remember the versions the user is editing against
+    st.session_state['row_versions'] = agency_df['Row Version'].to_dict()
+
     # Use st.data_editor for interactive editing
     edited_df = st.data_editor(
         agency_df,
@@ -209,49 +508,83 @@ def stakeholder_view(client, master_df):
                 help="Total budget spent on this activity to date.",
                 format="$ %d",
             ),
+            # Internal counter for conflict checks; kept in the data but not shown
+            "Row Version": None,
         },
         use_container_width=True,
         hide_index=True
     )
     
     if st.button("Save Updates"):
-        # Detect changes
-        changes = []
-        if not edited_df.equals(agency_df):
-            # Create a comparison dataframe to find what changed
-            diff_mask = (edited_df != agency_df).any(axis=1)
-            changed_rows = edited_df[diff_mask]
-
-            for index, row in changed_rows.iterrows():
-                original_row = master_df.loc[index]
-                activity_identifier = original_row['Activity']
-                change_details = {}
-                
-                # Check each editable column for changes
-                for col in ['End Date', 'Budget Spent', 'Progress / Achievement to Date']:
-                    if str(row[col]) != str(original_row[col]):
-                        change_details[col] = f"from '{original_row[col]}' to '{row[col]}'"
-                
-                if change_details:
-                    # Log the edit
-                    log_edit(
-                        client,
-                        st.session_state['user_name'],
-                        st.session_state['user_email'],
-                        st.session_state['user_agency'],
-                        activity_identifier,
-                        change_details
-                    )
-                    
-                    # Update master dataframe in memory
-                    master_df.loc[index, 'Last Updated'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    for col, val in row.items():
-                         master_df.loc[index, col] = val
-
-            # Update the Google Sheet
-            if update_gsheet_from_dataframe(client, master_df):
+        # Detect changes with a single vectorized comparison over the editable columns
+        editable = ['End Date', 'Budget Spent', 'Progress / Achievement to Date']
+        edited_df = edited_df.reindex(agency_df.index)
+        diff = pd.DataFrame({
+            col: comparable(edited_df[col], agency_df[col].dtype).ne(comparable(agency_df[col], agency_df[col].dtype))
+            for col in editable
+        })
+
+        if diff.values.any():
+            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            row_changes = {}
+            changed_cells = []
+
+            # Only visit the (row, column) pairs that actually differ
+            for i, j in np.argwhere(diff.values):
+                index = agency_df.index[i]
+                col = editable[j]
+                old_val = agency_df.iat[i, agency_df.columns.get_loc(col)]
+                new_val = edited_df.iat[i, edited_df.columns.get_loc(col)]
+                row_changes.setdefault(index, {})[col] = f"from '{to_cell_value(old_val)}' to '{to_cell_value(new_val)}'"
+                changed_cells.append((index, col, new_val))
+
+            # Re-read the edited rows and reject the save if any of them no longer holds the
+            # same activity, or was updated since it was loaded.
+            # Index labels are sheet positions: header is sheet row 1, so label 0 is sheet row 2
+            edited_indices = list(row_changes)
+            try:
+                header, current_rows = fetch_sheet_rows(client, [index + 2 for index in edited_indices])
+            except Exception as e:
+                st.error(f"Could not check for conflicting edits: {e}")
+                return
+            row_versions = st.session_state['row_versions']
+            conflicts = find_conflicts(agency_df, row_versions, header, edited_indices, current_rows)
+            if conflicts:
+                show_conflicts(agency_df, conflicts)
+                return
+
+            # Address cells by the sheet's current header rather than the loaded frame's columns
+            sheet_cols, cell_updates = locate_columns(header, editable + ['Last Updated', 'Row Version'])
+            for index, col, new_val in changed_cells:
+                cell_updates.append({
+                    "range": gspread.utils.rowcol_to_a1(index + 2, sheet_cols[col]),
+                    "values": [[to_cell_value(new_val)]],
+                })
+
+            changes_list = []
+            for index, change_details in row_changes.items():
+                changes_list.append((agency_df.at[index, 'Activity'], change_details))
+                sheet_row = index + 2
+                cell_updates.append({
+                    "range": gspread.utils.rowcol_to_a1(sheet_row, sheet_cols['Last Updated']),
+                    "values": [[now]],
+                })
+                cell_updates.append({
+                    "range": gspread.utils.rowcol_to_a1(sheet_row, sheet_cols['Row Version']),
+                    "values": [[int(row_versions.get(index, 1)) + 1]],
+                })
+
+            # Write only the edited cells to the Google Sheet
+            if batch_update_cells(client, cell_updates):
+                entries = build_log_entries(
+                    st.session_state['user_name'],
+                    st.session_state['user_email'],
+                    st.session_state['user_agency'],
+                    changes_list
+                )
+                flush_audit_log(client, entries)
                 st.success("Your updates have been saved successfully!")
-                st.rerun() # Rerun to show the latest data
+                st.rerun(scope="app") # Rerun the whole app to show the latest data
             else:
                 st.error("Failed to save updates. Please try again.")
         else:
@@ -261,20 +594,23 @@ def admin_view(client, master_df):
     """Displays the admin panel for viewing all data, downloading, and viewing logs."""
     st.sidebar.header("Admin Panel")
     if st.sidebar.button("Logout"):
-        for key in st.session_state.keys():
-            del st.session_state[key]
+        st.session_state.clear()
         st.rerun()
 
+    # Rebuild the agency index when it is missing or no longer matches the sheet
+    if not master_df.empty:
+        try:
+            if parse_agency_index(build_agency_index(master_df)) != get_agency_index():
+                update_agency_index(client, master_df)
+        except Exception as e:
+            st.warning(f"Could not check the agency index: {e}")
+
     st.header("Master Data View")
     st.info("As an admin, you can view all data, upload a new master CSV, and download the latest data.")
     
     st.dataframe(master_df, use_container_width=True)
     
     # --- CSV Download ---
-    @st.cache_data
-    def convert_df_to_csv(df):
-        return df.to_csv(index=False).encode('utf-8')
-
     csv_data = convert_df_to_csv(master_df)
     st.download_button(
         label="📥 Download Full Updated CSV",
@@ -286,15 +622,21 @@ def admin_view(client, master_df):
     st.markdown("---")
     
     # --- Audit Log Viewer ---
-    st.header("Audit Log of Edits")
-    try:
-        log_df = get_data_from_gsheet(client, worksheet_name="Audit_Log")
-        if not log_df.empty:
-            st.dataframe(log_df.sort_values(by="Timestamp", ascending=False), use_container_width=True)
-        else:
-            st.info("The audit log is currently empty.")
-    except Exception as e:
-        st.error(f"Could not load audit log: {e}")
+    with st.expander("Audit Log of Edits", expanded=False):
+        # Expander contents always run, so only fetch the log once the admin asks for it
+        if st.toggle("Load recent edits", key="show_audit_log"):
+            try:
+                log_df = load_audit_log()
+                if not log_df.empty:
+                    st.caption(
+                        f"Showing the {AUDIT_LOG_DISPLAY_LIMIT} most recent edits, newest first. "
+                        "Older entries are kept in the Audit_Log sheet."
+                    )
+                    st.dataframe(log_df, use_container_width=True)
+                else:
+                    st.info("The audit log is currently empty.")
+            except Exception as e:
+                st.error(f"Could not load audit log: {e}")
         
     st.markdown("---")
     
@@ -316,7 +658,10 @@ def admin_view(client, master_df):
                 if 'Last Updated' not in new_df.columns: new_df['Last Updated'] = None
                 
                 if st.button("Confirm Overwrite"):
+                    # Start above every existing version so edits loaded before the overwrite are rejected
+                    new_df['Row Version'] = int(master_df['Row Version'].max()) + 1 if not master_df.empty else 1
                     if update_gsheet_from_dataframe(client, new_df):
+                        update_agency_index(client, new_df)
                         st.success("Successfully overwrote the master data.")
                         st.rerun()
                     else: